@@ -1,5 +1,8 @@
 import sys
 import time
+import struct
+import random
+import array
 
 verbose_mode = 0
 
@@ -16,8 +19,37 @@ f.close()
 if(cnt > 2):
     if(sys.argv[2] == "-v"): verbose_mode = 1
 
+fw_pack_mult = 1
+#firmware is sent as 32-bit words with reversed byte order, tail padded with 0xFF:
+#prepare it once here so each frame is a single slice copy
+fw_pack_size = 32*fw_pack_mult
+fw_data_padded = fw_data + b'\xff' * (-fw_len % fw_pack_size)
+fw_words = array.array('I', fw_data_padded) #'I' is 4 bytes on all supported platforms
+fw_words.byteswap()
+fw_data_swapped = fw_words.tobytes()
+fw_view = memoryview(fw_data_swapped) #slicing the view does not copy
+#checksums of every frame (payload positions 1..32, pack id at position 0 is added on send)
+fw_checksums = []
+for pos in range(0, len(fw_data_swapped), fw_pack_size):
+    chunk = fw_data_swapped[pos:pos+fw_pack_size]
+    chk_all = sum(chunk)
+    chk_odd = sum(chunk[0::2])
+    chk_tri = chk_all - sum(chunk[2::3])
+    fw_checksums.append((chk_odd, chk_tri, chk_all))
+
 print("binary file read ok, length " + str(fw_len) + " bytes")
 
+#on linux wait for udev 'add' event if pyudev is available, otherwise poll the ports list
+udev_monitor = None
+if(sys.platform.startswith("linux")):
+    try:
+        import pyudev
+        udev_monitor = pyudev.Monitor.from_netlink(pyudev.Context())
+        udev_monitor.filter_by('tty')
+        udev_monitor.start() #started before listing ports so a device plugged in between is not missed
+    except Exception: #no pyudev, or netlink not available (containers, restricted sandboxes): poll instead
+        udev_monitor = None
+
 # list
 from serial.tools import list_ports
 port = list(list_ports.comports())
@@ -28,14 +60,16 @@ for p in port:
 print("===")
 print("waiting for target device plugged")
 tgt_device = ""
+known_devices = set(p.device for p in port)
+if(udev_monitor is not None):
+    for udev_dev in iter(udev_monitor.poll, None):
+        if(udev_dev.action == 'add' and udev_dev.device_node is not None and udev_dev.device_node not in known_devices):
+            tgt_device = udev_dev.device_node
+            break
 while(len(tgt_device) < 2):
     time.sleep(0.5)
-    port_new = list(list_ports.comports())
-    for p2 in port_new:
-        is_known = 0
-        for p in port:
-            if(p.device == p2.device): is_known = 1
-        if(is_known == 0):
+    for p2 in list_ports.comports():
+        if(p2.device not in known_devices):
             tgt_device = p2.device
             break
 
@@ -46,44 +80,52 @@ err_code_wrongcheck = 101;
 err_code_wronglen = 102;
 err_code_packmiss = 103;
 err_code_timeout = 104;
+rto_min_ms = 30 #response timeout, grows on consecutive timeouts
+rto_max_ms = 500
+rto_ms = rto_min_ms
 parse_buf = bytearray(0)
 upload_pack_id = -1
 response_pending = 0
 need_resend = 0
 pack_processed_ok = 1
 sent_packet = bytearray(256)
+empty_packet = bytes(256)
 last_err_code = 0
 
 def fw_upload_parser(data):
-    global pack_processed_ok, response_pending, need_resend, last_err_code
+    global pack_processed_ok, response_pending, need_resend, last_err_code, rto_ms
     parse_buf.extend(data)
     cnt = len(parse_buf)
     if(cnt < 4):
         return
     parsed_pos = 0
-    for i in range(cnt-4):
-        if(parse_buf[i] == 223 and parse_buf[i+1] == 98):
-            pack_id = parse_buf[i+2]
-            ret_code = parse_buf[i+3]
-            if(verbose_mode): print("resp: pack " + str(pack_id) + " code " + str(ret_code))
-            last_err_code = ret_code
-            if(pack_id == upload_pack_id and ret_code == err_code_ok):
-                response_pending = 2;
-                need_resend = 0;
-                pack_processed_ok = 1;
-            else:
-                response_pending = 2;
-                need_resend = 1;
-                if(ret_code == err_code_wrongcheck):
-                    print("chk err")
-            parsed_pos = i + 3;
+    pos = 0
+    while(1):
+        i = parse_buf.find(b'\xdf\x62', pos) #223, 98 header - search runs in C instead of per-byte python loop
+        if(i < 0 or i + 4 > cnt): break
+        pack_id = parse_buf[i+2]
+        ret_code = parse_buf[i+3]
+        if(verbose_mode): print("resp: pack " + str(pack_id) + " code " + str(ret_code))
+        last_err_code = ret_code
+        if(pack_id == upload_pack_id and ret_code == err_code_ok):
+            response_pending = 2;
+            need_resend = 0;
+            pack_processed_ok = 1;
+            rto_ms = rto_min_ms
+        else:
+            response_pending = 2;
+            need_resend = 1;
+            if(ret_code == err_code_wrongcheck):
+                print("chk err")
+        parsed_pos = i + 3;
+        pos = i + 4
     if(parsed_pos > 0): del parse_buf[0:parsed_pos]
     return cnt
 
 #read
 import serial
 import time
-ser = serial.Serial(port=tgt_device, baudrate=921600, parity=serial.PARITY_NONE, stopbits=1, bytesize=8, timeout=0)
+ser = serial.Serial(port=tgt_device, baudrate=921600, parity=serial.PARITY_NONE, stopbits=1, bytesize=8, timeout=0.01)
 
 print("trying to upload at: " + ser.portstr)
 last_data_upd = 0
@@ -92,45 +134,47 @@ upload_pending = 1
 upload_started = 0
 resend_cnt = 0
 upload_sent_bytes = 0
-last_response_time = time.time()*1000
-fw_pack_mult = 1
+sent_chunk_idx = -1
+last_response_time = time.monotonic_ns()
+
 
+sndbuf = bytearray(256+7) #reused for every packet, header bytes never change
+sndbuf[0] = 223
+sndbuf[1] = 98
 
-def send_data_serial(data, data_len):
-    pp = 0;
-    sndbuf = bytearray(data_len+7)
-    sndbuf[pp] = 223; pp += 1
-    sndbuf[pp] = 98; pp += 1
+def send_data_serial(data, data_len, chunk_idx = -1):
+    pp = 2;
     sndbuf[pp] = data_len+3; pp += 1 #payload length + checksum
-    for x in range(data_len):
-        sndbuf[pp] = data[x]; pp += 1
+    sndbuf[pp:pp+data_len] = memoryview(data)[0:data_len]; pp += data_len
 		
-    check_odd = 0;
-    check_tri = 0;
-    check_all = 0;
-    for x in range(3, pp):
-        if((x-3)%2 > 0): check_odd += sndbuf[x];
-        if((x-3)%3 > 0): check_tri += sndbuf[x];
-        check_all += sndbuf[x];
+    if(chunk_idx < 0):
+        payload = sndbuf[3:pp]
+        check_all = sum(payload);
+        check_odd = sum(payload[1::2]); #odd positions
+        check_tri = check_all - sum(payload[0::3]); #all positions not divisible by 3
+    else: #firmware frame: only pack id differs from precomputed values, it counts in check_all only
+        check_odd, check_tri, check_all = fw_checksums[chunk_idx]
+        check_all += data[0]
 
     sndbuf[pp] = check_odd&0xFF; pp += 1
     sndbuf[pp] = check_tri&0xFF; pp += 1
     sndbuf[pp] = check_all&0xFF; pp += 1
     sndbuf[pp] = 0; pp += 1
     
-    ser.write(sndbuf)
+    ser.write(memoryview(sndbuf)[0:pp])
 
 prev_reported_complete = 0
 
 while(1):
-    cnt = ser.in_waiting
-    if(cnt > 0):
-        data = ser.read(cnt)
+#while waiting for a reply, block in read (up to port timeout) instead of spinning on in_waiting
+    if(response_pending == 1): data = ser.read(max(1, ser.in_waiting))
+    else: data = ser.read(ser.in_waiting)
+    if(len(data) > 0):
         fw_upload_parser(data)
         
 #    print("resend_cnt " + str(resend_cnt) + " response_pending " + str(response_pending) + " need_resend " + str(need_resend))
     if(upload_pending == 0 and response_pending == 0): break
-    cur_time = time.time()*1000
+    cur_time = time.monotonic_ns()
     if(resend_cnt > 20 and fw_len - upload_sent_bytes < 32):
         response_pending = 2
     if(resend_cnt > 200):
@@ -143,8 +187,9 @@ while(1):
                 upload_pending = 0;
                 print("...done!");	
             response_pending = 0;
-        if(cur_time - last_response_time > 30):
+        if(cur_time - last_response_time > rto_ms*1000000):
             last_response_time = cur_time;
+            rto_ms = min(rto_max_ms, int(rto_ms*1.5 + random.uniform(0, 10))) #back off with jitter
             last_err_code = err_code_timeout;
             response_pending = 0;
             need_resend = 1;
@@ -159,7 +204,7 @@ while(1):
             else:
                 print("...timeout, resending, id: " + str(sent_packet[0]));
 
-        send_data_serial(sent_packet, 33);
+        send_data_serial(sent_packet, 33, sent_chunk_idx);
         response_pending = 1;
         need_resend = 0;
         continue
@@ -168,25 +213,22 @@ while(1):
     if(upload_started == 0):
         last_response_time = cur_time;
         print("starting upload...");
-        upload_start_code = [0x10, 0xFC, 0xA3, 0x05, 0xC0, 0xDE, 0x11, 0x77];
+        upload_start_code = bytes([0x10, 0xFC, 0xA3, 0x05, 0xC0, 0xDE, 0x11, 0x77]);
 
         upload_pack_id = 100;
         ppos = 0;
-        for n in range(256): sent_packet[n] = 0;
+        sent_packet[:] = empty_packet
 		
         sent_packet[ppos] = upload_pack_id; ppos += 1
-        for n in range(8):
-            sent_packet[ppos] = upload_start_code[n]; ppos += 1
+        sent_packet[ppos:ppos+8] = upload_start_code; ppos += 8
         code_length = fw_len;
-        sent_packet[ppos] = (code_length>>24)&0xFF; ppos += 1
-        sent_packet[ppos] = (code_length>>16)&0xFF; ppos += 1
-        sent_packet[ppos] = (code_length>>8)&0xFF; ppos += 1
-        sent_packet[ppos] = code_length&0xFF; ppos += 1
+        struct.pack_into('>I', sent_packet, ppos, code_length); ppos += 4
 #        sent_packet[ppos] = fw_pack_mult; ppos += 1
 
         if(verbose_mode): print("size bytes: " + str(sent_packet[ppos-4]) + " " + str(sent_packet[ppos-3]) + " " + str(sent_packet[ppos-2]) + " " + str(sent_packet[ppos-1]));
 
         upload_sent_bytes = 0;
+        sent_chunk_idx = -1
 
         send_data_serial(sent_packet, 33);
         upload_started = 1;
@@ -200,8 +242,7 @@ while(1):
             upload_pack_id += 1;
             upload_pack_id = upload_pack_id&0xFF;
 
-        ppos = 0;
-        for n in range(256): sent_packet[n] = 0;
+        ppos = 0; #pack id and full frame are written below, no need to clear sent_packet
 		
         if(verbose_mode): print("sending frame " + str(upload_pack_id) + " bytes remains " + str(fw_len - upload_sent_bytes));
         else:
@@ -211,18 +252,14 @@ while(1):
                 print(str(prev_reported_complete) + "% complete")
 
         sent_packet[ppos] = upload_pack_id; ppos += 1
-        for w in range(8*fw_pack_mult):
-            for n in range(4):
-                idx = upload_sent_bytes + w*4 + 3-n;
-                if(idx < fw_len):
-                    sent_packet[ppos] = fw_data[idx]; ppos += 1
-                else:
-                    sent_packet[ppos] = 0xFF; ppos += 1
+        sent_packet[ppos:ppos+fw_pack_size] = fw_view[upload_sent_bytes:upload_sent_bytes+fw_pack_size]
+        ppos += fw_pack_size
+        sent_chunk_idx = upload_sent_bytes // fw_pack_size
 		
         if(pack_processed_ok > 0):
-            upload_sent_bytes += 32*fw_pack_mult;
+            upload_sent_bytes += fw_pack_size;
 		
-        send_data_serial(sent_packet, 33);
+        send_data_serial(sent_packet, 33, sent_chunk_idx);
         response_pending = 1;
         need_resend = 0;
         pack_processed_ok = 0;
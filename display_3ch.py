@@ -7,33 +7,23 @@ pygame.init()
 size = width, height = 1200, 500
 screen = pygame.display.set_mode(size)
 
+bsize = 150
+bratio = 3
+DX = 100
+DY = 300
+#only the bars region changes between frames
+bars_rect = pygame.Rect(DX, DY - bsize, 5 * bsize // bratio, bsize)
+bar_w = bsize / bratio
+bar_cl = 0,120,160
+
 def draw_3ch(ch0, ch1, ch2):
-    for event in pygame.event.get():
-        if(event.type == pygame.QUIT): sys.exit()
-    bsize = 150
-    bratio = 3
-    DX = 100
-    DY = 300
-    screen.fill([0,0,0])
-    screen.lock()
-    bx = DX
-    sy = ch0 * bsize
-    sx = bsize / bratio
-    by = DY - sy
-    cl = 0,120,160
-    screen.fill(cl,(bx,by,sx,sy))
-    bx += 2*sx
-    sy = ch1 * bsize
-    by = DY - sy
-    screen.fill(cl,(bx,by,sx,sy))
-    bx += 2*sx
-    sy = ch2 * bsize
-    by = DY - sy
-    screen.fill(cl,(bx,by,sx,sy))
+    if(pygame.event.peek(pygame.QUIT)): sys.exit()
+    pygame.event.clear() #drop the rest without building a list of events
+    screen.fill([0,0,0], bars_rect)
+    for n, ch in enumerate((ch0, ch1, ch2)):
+        sy = ch * bsize
+        screen.fill(bar_cl, (DX + 2*n*bar_w, DY - sy, bar_w, sy))
             
 #    screen.blit(ball, ballrect)
-    screen.unlock()
-    pygame.display.flip()        
+    pygame.display.update(bars_rect)
     return 0
-
-
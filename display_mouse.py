@@ -2,153 +2,230 @@
 
 import sys, pygame
 from math import *
+from array import array
+import functools
 pygame.init()
 
 size = width, height = 250, 200
 screen = pygame.display.set_mode(size)
+font = pygame.font.SysFont(None, 22) #loading a font is slow, do it once
+pygame.event.set_blocked(None) #only events draw_mouse handles are queued
+pygame.event.set_allowed([pygame.QUIT, pygame.MOUSEBUTTONDOWN])
 
+#colors converted once, pygame accepts Color objects without unpacking a tuple each call
+color_black = pygame.Color(0,0,0)
+color_green = pygame.Color(80,155,0)
+color_cyan = pygame.Color(0,255,160)
+color_red = pygame.Color(255,0,0)
+color_magenta = pygame.Color(255,0,255)
+color_pink = pygame.Color(200,50,150)
+color_teal = pygame.Color(0,50,50)
+text_cache = {}
+
+def render_text(text, cl):
+    key = (text, tuple(cl)) #Color objects are not hashable
+    img = text_cache.get(key)
+    if(img is None): #rasterize each string only once
+        img = font.render(text, True, cl).convert_alpha() #display pixel format, blits without conversion
+        text_cache[key] = img
+    return img
+
+#sin/cos lookup, 1024 steps per turn (~0.35 degree) is far finer than a 70px arrow can show
+sincos_len = 1024
+sincos_k = sincos_len / (2*pi)
+sin_table = array('d', [sin(2*pi*i/sincos_len) for i in range(sincos_len)])
+cos_table = array('d', [cos(2*pi*i/sincos_len) for i in range(sincos_len)])
+
+def sincos(angle):
+    i = int(angle * sincos_k) & (sincos_len-1)
+    return sin_table[i], cos_table[i]
+
+
+#arrow geometry around the origin: tail, head, two barb ends
+arrow_cl = color_green
+arrow_ref_x = 125
+arrow_ref_y = 100
+arrow_length = 70
+arrow_asize = 20
+arrow_pts = ((-arrow_length/2, 0), (arrow_length/2, 0),
+             (arrow_length/2 - arrow_asize/2, -arrow_asize/2), (arrow_length/2 - arrow_asize/2, arrow_asize/2))
+
+prev_rects = [] #areas drawn in the previous frame: only these are cleared, and need refresh too
+shown_bg = None #calibration background currently on screen
+
+def clear_prev_rects():
+    global prev_rects, shown_bg
+    if(shown_bg is not None): #leaving calibration: its static background covers the whole screen
+        screen.fill(color_black)
+        prev_rects = [screen.get_rect()]
+        shown_bg = None
+    else:
+        for r in prev_rects: screen.fill(color_black, r)
+
+def update_rects(rects):
+    global prev_rects
+    pygame.display.update(prev_rects + rects)
+    prev_rects = rects
+
+def arrow_polyline(angle):
+    ref_x = arrow_ref_x
+    ref_y = arrow_ref_y
+    sa, ca = sincos(angle)
+    #integer pixels keep axis-aligned arrows straight without snapping checks
+    (rx0, ry0), (rx1, ry1), (rxa1, rya1), (rxb1, ryb1) = [(round(x*ca + y*sa + ref_x), round(y*ca - x*sa + ref_y)) for x, y in arrow_pts]
+    return [(rx0, ry0), (rx1, ry1), (rxa1, rya1), (rx1, ry1), (rxb1, ryb1)]
+
+def draw_arrow_polyline(pts, surf = screen):
+    return pygame.draw.lines(surf, arrow_cl, False, pts, 4)
 
 def draw_arrow(angle):
-    cl = 80,155,0
-    ref_x = 125
-    ref_y = 100
-    length = 70
-    asize = 20
-    x0 = -length/2
-    y0 = 0
-    x1 = length/2
-    y1 = 0
-    xa1 = x1 - asize/2
-    ya1 = y1 - asize/2
-    xb1 = x1 - asize/2
-    yb1 = y1 + asize/2
-    rx0 = x0 * cos(angle) + y0 * sin(angle) + ref_x
-    ry0 = y0 * cos(angle) - x0 * sin(angle) + ref_y
-    rx1 = x1 * cos(angle) + y1 * sin(angle) + ref_x
-    ry1 = y1 * cos(angle) - x1 * sin(angle) + ref_y
-    if(rx1 - rx0 < 2 and rx1 - rx0 > -2): rx1 = rx0
-    if(ry1 - ry0 < 2 and ry1 - ry0 > -2): ry1 = ry0
-    rxa1 = xa1 * cos(angle) + ya1 * sin(angle) + ref_x
-    rya1 = ya1 * cos(angle) - xa1 * sin(angle) + ref_y
-    rxb1 = xb1 * cos(angle) + yb1 * sin(angle) + ref_x
-    ryb1 = yb1 * cos(angle) - xb1 * sin(angle) + ref_y
-    pygame.draw.line(screen, cl, (rx0, ry0), (rx1, ry1), 4)
-    pygame.draw.line(screen, cl, (rxa1, rya1), (rx1, ry1), 4)
-    pygame.draw.line(screen, cl, (rxb1, ryb1), (rx1, ry1), 4)
+    return draw_arrow_polyline(arrow_polyline(angle))
+
+half_pi = pi*0.5
+
+#calibration arrows point in fixed directions, rotate them once
+arrow_right = arrow_polyline(0)
+arrow_up = arrow_polyline(half_pi)
+
+#static part of each calibration stage, drawn once into the stage background
+def calib_center(surf, text):
+    cl = color_cyan
+    surf.blit(render_text(text, cl), (70, 30))
+    pygame.draw.circle(surf, cl, (125, 100), 5)
+
+def calib_muscle(surf, text, progress):
+    cl = color_cyan
+    if(progress > 60):
+        img = render_text(text + ' active', cl)
+        pygame.draw.circle(surf, color_pink, (125, 100), 30)
+    else:
+        img = render_text(text + ' relaxed', cl)
+        pygame.draw.circle(surf, color_teal, (125, 100), 30)
+    surf.blit(img, (70, 30))
+
+def calib_stage0(surf, progress):
+    calib_center(surf, 'Keep at center')
+
+def calib_stage1(surf, progress):
+    surf.blit(render_text('Move right', color_cyan), (90, 30))
+    draw_arrow_polyline(arrow_right, surf)
+
+def calib_stage2(surf, progress):
+    calib_center(surf, 'Return to center')
+
+def calib_stage3(surf, progress):
+    surf.blit(render_text('Move up', color_cyan), (90, 30))
+    draw_arrow_polyline(arrow_up, surf)
+
+def calib_stage5(surf, progress):
+    surf.blit(render_text('Rotate right', color_cyan), (90, 30))
+
+def calib_stage6(surf, progress):
+    calib_muscle(surf, 'Move muscle', progress)
+
+def calib_stage7(surf, progress):
+    calib_muscle(surf, 'Click muscle', progress)
+
+calib_stages = {0: calib_stage0, 1: calib_stage1, 2: calib_stage2, 3: calib_stage3,
+                4: calib_stage2, 5: calib_stage5, 6: calib_stage6, 7: calib_stage7}
+
+#parts changing with progress, drawn on screen every frame
+calib_arc_rect = (90, 65, 70, 70) #70px circle around (125, 100)
+
+def calib_stage5_arc(progress):
+    return [pygame.draw.arc(screen, color_green, calib_arc_rect, 1-0.02*progress, half_pi, 4)]
+
+calib_dynamic = {5: calib_stage5_arc}
+
+calib_bg = {}
+
+def calib_background(stage, progress):
+    key = (stage, stage in (6, 7) and progress > 60) #muscle stages switch picture at 60%
+    bg = calib_bg.get(key)
+    if(bg is None):
+        bg = pygame.Surface(size).convert()
+        bg.fill(color_black)
+        pygame.draw.rect(bg, color_green, (20, 170, 201, 21), 1) #same pixels as lines from (20,170) to (220,190)
+        draw_stage = calib_stages.get(stage)
+        if(draw_stage is not None): draw_stage(bg, progress)
+        calib_bg[key] = bg
+    return bg
 
 def draw_calibrate(stage, progress):
-    screen.fill([0,0,0])
-    screen.lock()
-    cl = 80,155,0
-    pygame.draw.line(screen, cl, (20, 170), (20, 190))
-    pygame.draw.line(screen, cl, (20, 170), (220, 170))
-    pygame.draw.line(screen, cl, (20, 190), (220, 190))
-    pygame.draw.line(screen, cl, (220, 170), (220, 190))
-    screen.fill(cl,(20, 170, progress*2, 20))    
-    screen.unlock()
-    cl = 0,255,160
-    if(stage == 0):
-        font = pygame.font.SysFont(None, 22)
-        img = font.render('Keep at center', True, cl)
-        screen.blit(img, (70, 30))    
-        pygame.draw.circle(screen, cl, (125, 100), 5)
-    if(stage == 1):
-        font = pygame.font.SysFont(None, 22)
-        img = font.render('Move right', True, cl)
-        screen.blit(img, (90, 30))
-        draw_arrow(0) 
-    if(stage == 2 or stage == 4):
-        font = pygame.font.SysFont(None, 22)
-        img = font.render('Return to center', True, cl)
-        screen.blit(img, (70, 30))    
-        pygame.draw.circle(screen, cl, (125, 100), 5)
-    if(stage == 3):
-        font = pygame.font.SysFont(None, 22)
-        img = font.render('Move up', True, cl)
-        screen.blit(img, (90, 30))
-        draw_arrow(3.1415926*0.5) 
-    if(stage == 5):
-        font = pygame.font.SysFont(None, 22)
-        img = font.render('Rotate right', True, cl)
-        screen.blit(img, (90, 30))
-        size = 70
-        cl = 80,155,0
-        pygame.draw.arc(screen, cl, (125-size/2, 100-size/2, size, size), 1-0.02*progress, 1.57, 4)
-    if(stage == 6):
-        font = pygame.font.SysFont(None, 22)
-        if(progress > 60):
-            img = font.render('Move muscle active', True, cl)
-            cl = 200,50,150
-            pygame.draw.circle(screen, cl, (125, 100), 30)
-        else:
-            img = font.render('Move muscle relaxed', True, cl)
-            cl = 0,50,50
-            pygame.draw.circle(screen, cl, (125, 100), 30)
-        screen.blit(img, (70, 30))
-    if(stage == 7):
-        font = pygame.font.SysFont(None, 22)
-        if(progress > 60):
-            img = font.render('Click muscle active', True, cl)
-            cl = 200,50,150
-            pygame.draw.circle(screen, cl, (125, 100), 30)
-        else:
-            img = font.render('Click muscle relaxed', True, cl)
-            cl = 0,50,50
-            pygame.draw.circle(screen, cl, (125, 100), 30)
-        screen.blit(img, (70, 30))
-    pygame.display.flip()
+    global prev_rects, shown_bg
+    bg = calib_background(stage, progress)
+    if(bg is not shown_bg): #stage changed: show the whole new background
+        screen.blit(bg, (0, 0))
+        prev_rects = [screen.get_rect()]
+        shown_bg = bg
+    else: #restore only what was drawn over the background in the previous frame
+        for r in prev_rects: screen.blit(bg, r, r)
+    rects = [screen.fill(color_green,(20, 170, progress*2, 20))] #progress may briefly pass 100 and leave the frame
+    draw_dynamic = calib_dynamic.get(stage)
+    if(draw_dynamic is not None): rects += draw_dynamic(progress)
+    update_rects(rects)
+
+#render all stage pictures and labels at startup, so entering a stage never waits on font rendering
+for stage in calib_stages:
+    calib_background(stage, 0)
+    if(stage in (6, 7)): calib_background(stage, 100)
+render_text('Calibrate', color_cyan)
+
+#draw_mouse layout
+c_scale = 20 #motion line
+c_dx = 100
+c_dy = 100
+s_dx = 180 #scroll bar
+s_dy = 100
+s_width = 20
+s_scale = 5
+m_dx0 = 5 #muscle level bars
+ww = 10
+m_dx1 = m_dx0 + 5 + ww
+m_scale = 0.1
+cl_dx = 150 #click indicator
+cl_dy = 20
+cl_sz = 20
+calib_x = width-70 #'Calibrate' button
+calib_y = height-20
+
+@functools.lru_cache(maxsize=8) #thresholds change only on calibration
+def thresholds_y(THR0_H, THR0_L, THR1_H, THR1_L):
+    return int(THR0_H*m_scale), int(THR0_L*m_scale), int(THR1_H*m_scale), int(THR1_L*m_scale)
 
 def draw_mouse(m_dx, m_dy, m_r, m_click, ch0, THR0_H, THR0_L, ch1, THR1_H, THR1_L):
-    for event in pygame.event.get():
+    click_pos = None
+    for event in pygame.event.get([pygame.QUIT, pygame.MOUSEBUTTONDOWN]):
         if(event.type == pygame.QUIT): sys.exit()
-    screen.fill([0,0,0])    
+        elif(event.type == pygame.MOUSEBUTTONDOWN and event.button == 1): click_pos = event.pos
+    clear_prev_rects()
+    rects = []
         
 #draw motion
-    c_scale = 20
-    c_dx = 100
-    c_dy = 100
-    cl = 0,255,160
-    pygame.draw.line(screen, cl, (c_dx, c_dy), (c_dx + m_dx*c_scale, c_dy - m_dy*c_scale))
+    cl = color_cyan
+    rects.append(pygame.draw.line(screen, cl, (c_dx, c_dy), (c_dx + m_dx*c_scale, c_dy - m_dy*c_scale)))
 #draw scroll 
-    screen.lock()
-    s_dx = 180
-    s_dy = 100
-    s_width = 20
-    s_scale = 5   
     if(m_r > 0):
-        screen.fill(cl,(s_dx, s_dy - m_r*s_scale, s_width, m_r*s_scale))
+        rects.append(screen.fill(cl,(s_dx, s_dy - m_r*s_scale, s_width, m_r*s_scale)))
     else:
-        screen.fill(cl,(s_dx, s_dy, s_width, -m_r*s_scale))
+        rects.append(screen.fill(cl,(s_dx, s_dy, s_width, -m_r*s_scale)))
 #draw muscle levels
-    m_dx0 = 5
-    ww = 10
-    m_dx1 = m_dx0 + 5 + ww
-    scale = 0.1
-    screen.fill(cl,(m_dx0, 0, ww, ch0*scale))
-    pygame.draw.line(screen, (255,0,0), (m_dx0, THR0_L*scale), (m_dx0 + ww, THR0_L*scale))
-    pygame.draw.line(screen, (255,0,255), (m_dx0, THR0_H*scale), (m_dx0 + ww, THR0_H*scale))
-    screen.fill(cl,(m_dx1, 0, ww, ch1*scale))
-    pygame.draw.line(screen, (255,0,0), (m_dx1, THR1_L*scale), (m_dx1 + ww, THR1_L*scale))
-    pygame.draw.line(screen, (255,0,255), (m_dx1, THR1_H*scale), (m_dx1 + ww, THR1_H*scale))
+    y_h0, y_l0, y_h1, y_l1 = thresholds_y(THR0_H, THR0_L, THR1_H, THR1_L)
+    rects.append(screen.fill(cl,(m_dx0, 0, ww, ch0*m_scale)))
+    rects.append(screen.fill(cl,(m_dx1, 0, ww, ch1*m_scale)))
+#threshold marks as 1px high fills, ww+1 wide to match the former line end points
+    rects.append(screen.fill(color_red,(m_dx0, y_l0, ww+1, 1)))
+    rects.append(screen.fill(color_red,(m_dx1, y_l1, ww+1, 1)))
+    rects.append(screen.fill(color_magenta,(m_dx0, y_h0, ww+1, 1)))
+    rects.append(screen.fill(color_magenta,(m_dx1, y_h1, ww+1, 1)))
 
 #draw click
-    cl_dx = 150
-    cl_dy = 20
-    cl_sz = 20
     if(m_click > 0):
-        screen.fill(cl,(cl_dx, cl_dy, cl_sz, cl_sz))
-    screen.unlock()
-    font = pygame.font.SysFont(None, 22)
-    img = font.render('Calibrate', True, cl)
-    screen.blit(img, (width-70, height-20))    
+        rects.append(screen.fill(cl,(cl_dx, cl_dy, cl_sz, cl_sz)))
+    img = render_text('Calibrate', cl)
+    rects.append(screen.blit(img, (calib_x, calib_y)))
     calibrate_requested = 0
-    if(pygame.mouse.get_pressed()[0]):
-        pos = pygame.mouse.get_pos()
-        if(pos[0] > width-70 and pos[1] > height-20):
-            calibrate_requested = 1
-        print(pos)
-    pygame.display.flip()        
+    if(click_pos is not None and click_pos[0] > calib_x and click_pos[1] > calib_y):
+        calibrate_requested = 1
+    update_rects(rects)
     return calibrate_requested
-
-
-
@@ -1,39 +1,141 @@
 #drawing via pygame
 
-import sys, pygame
+import sys, pygame, operator
 from math import *
+from collections import defaultdict
+import numpy as np
 pygame.init()
 
 max_devices = 64
 size = width, height = 1200, 500
 screen = pygame.display.set_mode(size)
+pygame.event.set_blocked(None)
+pygame.event.set_allowed([pygame.QUIT]) #nothing else is handled, keep the queue empty
 
 plot_len = 2000
 spg_len = 200
-plot_emg = []
-plot_spg = []
-plot_ax = []
-plot_ay = []
-plot_az = []
-plot_Q = []
-dev_rssi = [0]*max_devices
-dev_batt = [0]*max_devices
-dev_mag_angle = [0]*max_devices
+#ring buffers: emg_head / spg_head point to the oldest entry (next one to be overwritten)
+#stored at the width the device sends them: signed 16 bit samples, unsigned 16 bit spectrum
+plot_emg = np.zeros((max_devices, plot_len), dtype=np.int16)
+plot_spg = np.zeros((max_devices, 4, spg_len), dtype=np.uint16) #one row per spectrum band
+plot_accel = np.zeros((max_devices, spg_len, 3), dtype=np.int16) #ax, ay, az
+plot_Q = np.zeros((max_devices, spg_len, 4), dtype=np.int16)
+emg_head = [0]*max_devices
+spg_head = [0]*max_devices
+new_samples = [0]*max_devices #EMG samples added since plot_cycle_lines last drew the device
+#status stays float64: values derived from numpy float32 scalars are rejected in pygame rects
+dev_rssi = np.zeros(max_devices)
+dev_batt = np.zeros(max_devices)
+dev_mag_angle = np.zeros(max_devices)
 y_scale = [0.3]*max_devices
 y_zero = [12000]*max_devices
 last_data_id = [0]*max_devices
 not_updated_cnt = [10000]*max_devices
 active_devices = 0
+plot_dirty = False #set by plot_prepare when new data arrived since the last redraw
+
+#y_zero tracks the EMG baseline with a 0.997 exponential average, applied a whole packet at a time
+y_zero_decay = 0.997 ** np.arange(65)
+y_zero_w = 0.003 * y_zero_decay[63::-1] #weight of each of the last 64 samples, newest last
 
 def plot_init():
     global plot_emg, max_devices
+    for buf in (plot_emg, plot_spg, plot_accel, plot_Q): buf.fill(0)
     for i in range(max_devices):
-        plot_emg.append([0]*plot_len)
-        plot_spg.append([0]*spg_len*4)
-        plot_ax.append([0]*spg_len)
-        plot_ay.append([0]*spg_len)
-        plot_az.append([0]*spg_len)
-        plot_Q.append([0]*spg_len*4)
+        emg_head[i] = 0
+        spg_head[i] = 0
+        new_samples[i] = 0
+        trace_dy[i] = None
+
+#buffer contents in time order, oldest first
+def emg_ordered(d):
+    return np.roll(plot_emg[d], -emg_head[d])
+
+#x positions of trace points never change, only y does
+lines_x = 10 + np.arange(plot_len) * ((width - 20) / plot_len)
+tester_acc_x = 10 + np.arange(spg_len) * (0.4*(width - 20) / spg_len)
+#tester EMG trace has ~4 samples per pixel: it is drawn as a min/max envelope, one column per pixel
+tester_emg_w = int(0.4*(width - 20))
+tester_emg_bins = np.arange(tester_emg_w) * plot_len // tester_emg_w
+tester_emg_x = np.repeat(10 + 0.4*(width - 20) + 10 + np.arange(tester_emg_w), 2)
+
+def trace_xy(x_coords, y):
+    xy = np.empty((len(x_coords), 2)) #float64: pygame.draw rejects float32 point arrays
+    xy[:,0] = x_coords
+    xy[:,1] = y
+    return xy
+
+#point buffers reused by every device, only the y column is rewritten
+lines_xy = trace_xy(lines_x, 0)
+tester_acc_xy = trace_xy(tester_acc_x, 0)
+tester_emg_xy = trace_xy(tester_emg_x, 0)
+lines_tail_xy = trace_xy(lines_x, 0)
+
+#y = y0 + vals*k in time order, where vals is a ring buffer with its oldest entry at head
+def trace_set(xy, vals, head, y0, k):
+    n = len(vals) - head
+    ys = xy[:,1]
+    np.multiply(vals[head:], k, out=ys[0:n])
+    np.multiply(vals[0:head], k, out=ys[n:])
+    ys += y0
+    return xy
+
+#interleaved per-column minimum and maximum of vals, columns start at bins
+def envelope(vals, bins):
+    env = np.empty(len(bins)*2, dtype=vals.dtype)
+    env[0::2] = np.minimum.reduceat(vals, bins)
+    env[1::2] = np.maximum.reduceat(vals, bins)
+    return env
+
+#plot_cycle_lines keeps each trace on its own surface: every frame the surface is
+#scrolled left by the new samples' width and only the new tail is drawn.
+#trace_shift holds the sub-pixel part of the scroll that is not applied yet.
+#Surfaces reach trace_margin pixels past the top and bottom of the screen: when the EMG
+#baseline y_zero moves, the surface is blitted that much higher or lower instead of being
+#redrawn. trace_y0 is the trace offset (DY - y_zero*y_scale) the surface was drawn with
+lines_dx = (width - 20) / plot_len
+trace_margin = 100
+trace_h = height + 2*trace_margin
+lines_area = pygame.Rect(10, 0, width-20, height)
+trace_surf = [None]*max_devices
+trace_dy = [None]*max_devices
+trace_y0 = [0.0]*max_devices
+trace_shift = [0.0]*max_devices
+
+#returns the device's trace surface and the screen y to blit it at
+def trace_update(d, DY):
+    surf = trace_surf[d]
+    if(surf is None):
+        surf = pygame.Surface((width, trace_h))
+        surf.set_colorkey((0,0,0))
+        trace_surf[d] = surf
+        trace_dy[d] = None
+    n = new_samples[d]
+    new_samples[d] = 0
+    cl = dev_colors[d]
+    y0 = DY - y_zero[d]*y_scale[d]
+    if(trace_dy[d] != DY or n >= plot_len or abs(y0 - trace_y0[d]) > trace_margin): #layout changed, everything is new or baseline drifted past the margin: full redraw
+        surf.fill((0,0,0))
+        trace_dy[d] = DY
+        trace_y0[d] = y0
+        trace_shift[d] = 0.0
+        pygame.draw.lines(surf, cl, False, trace_set(lines_xy, plot_emg[d], emg_head[d], trace_margin + y0, y_scale[d]))
+        return surf, -trace_margin
+    if(n < 1): return surf, round(y0 - trace_y0[d]) - trace_margin
+    shift = trace_shift[d] + n*lines_dx
+    dx = int(shift)
+    trace_shift[d] = shift - dx
+    if(dx > 0):
+        surf.scroll(-dx, 0)
+        surf.fill((0,0,0), (width-dx, 0, dx, trace_h))
+    eh = emg_head[d]
+    xy = lines_tail_xy[0:n+1]
+    np.add(lines_x[-n-1:], trace_shift[d], out=xy[:,0])
+    tail = plot_emg[d].take(np.arange(eh-n-1, eh), mode='wrap')
+    np.multiply(tail, y_scale[d], out=xy[:,1])
+    xy[:,1] += trace_margin + trace_y0[d]
+    pygame.draw.lines(surf, cl, False, xy)
+    return surf, round(y0 - trace_y0[d]) - trace_margin
 
 def num_to_color(n):
     if(n == 0): return 0, 200, 0
@@ -45,178 +147,211 @@ def num_to_color(n):
     if(n == 6): return 250, 250, 100
     return 100, 100, 100
 
+dev_colors = [pygame.Color(num_to_color(n)) for n in range(max_devices)]
+color_red = pygame.Color(255,0,0)
+color_yellow = pygame.Color(255,255,0)
+color_blue = pygame.Color(0,0,255)
+color_batt_low = pygame.Color(150,0,0)
+
+#shared event handling of the plot_cycle_* views: only QUIT is queued
+def plot_events():
+    if(pygame.event.peek(pygame.QUIT)): sys.exit()
+
 def plot_cycle_lines():
-    global plot_emg, max_devices, last_data_id, y_zero, y_scale, plot_len, active_devices
-    for event in pygame.event.get():
-        if(event.type == pygame.QUIT): sys.exit()
-    screen.fill([0,0,0])
+    global plot_emg, max_devices, last_data_id, y_zero, y_scale, plot_len, active_devices, plot_dirty
+    plot_events()
+    if(not plot_dirty): return active_devices
+    plot_dirty = False
+    screen.fill([0,0,0], lines_area)
     cur_devices = 0
-    screen.lock()
     for d in range(max_devices):
         if(not_updated_cnt[d] > 1000): continue
         cur_devices += 1
-        xy = []
-        DX = 10
         DY = height/(1+active_devices) * (d+1)
-        x_scale = (width - DX*2) / plot_len
-        for x in range(plot_len):
-            xy.append([DX+x*x_scale, DY+(plot_emg[d][x]-y_zero[d])*y_scale[d]])
-        cl = num_to_color(d)
-        
-        pygame.draw.lines(screen, cl, False, xy)
+        surf, y = trace_update(d, DY)
+        screen.blit(surf, (lines_area.x, y), (lines_area.x, 0, lines_area.w, trace_h))
 #    screen.blit(ball, ballrect)
-    screen.unlock()
-    pygame.display.flip()        
+    pygame.display.update(lines_area) #nothing is ever drawn into the side margins
     active_devices = cur_devices
     return active_devices
 
-def val_to_color(val):
+#spectrogram color scale, for a whole array of values at once
+#writes into out (uint8, vals.shape + (3,)) when given
+def val_to_color_array(vals, out = None):
     color_scale = 100
-    if(val < 0): val = 0
+    v = np.maximum(vals, 0).astype(np.float64)
     tb = 10.0*color_scale*0.01
-    tg = 100.0*color_scale*0.01;
-    tr = 1000.0*color_scale*0.01;
-    wg = tg-tb;
-    wr = tr-tg;
-    r = 0; g = 0; b = 0;
-    if(val < tb):
-        r = 10;
-        g = 0;
-        b = int(val/tb*255);
-        return r,g,b
-        
-    if(val < tg):
-        r = 0;
-        b = int((tg-val-tb)/wg*255);
-        if(b < 0): b = 0
-        g = int((val-tb)/wg*255);
-        return r,g,b
-
-    if(val < tr):
-        b = 0;
-        g = int((tr-val-tg)/wr*255);
-        if(g < 0): g = 0
-        r = int((val-tg)/wr*255);
-        return r,g,b
-
-    r = 255;
-    g = int(val/tr*2.5);
-    b = int(val/tr*25.5);
-    if(g > 255): g = 255;
-    if(b > 255): b = 255;
-    return r,g,b
+    tg = 100.0*color_scale*0.01
+    tr = 1000.0*color_scale*0.01
+    wg = tg-tb
+    wr = tr-tg
+    m = v < tr
+    r = np.where(m, (v-tg)/wr*255, 255)
+    g = np.where(m, np.maximum((tr-v-tg)/wr*255, 0), np.minimum(v/tr*2.5, 255))
+    b = np.where(m, 0, np.minimum(v/tr*25.5, 255))
+    m = v < tg
+    r[m] = 0
+    g[m] = (v[m]-tb)/wg*255
+    b[m] = np.maximum((tg-v[m]-tb)/wg*255, 0)
+    m = v < tb
+    r[m] = 10
+    g[m] = 0
+    b[m] = v[m]/tb*255
+    rgb = out
+    if(rgb is None): rgb = np.empty(v.shape + (3,), dtype=np.uint8)
+    rgb[...,0] = r
+    rgb[...,1] = g
+    rgb[...,2] = b
+    return rgb
 
+#colors of all 16 bit integer values;
+#the lowest spectrum band is shown at 0.01 scale and gets its own table
+val_color_lut = val_to_color_array(np.arange(65536))
+val_color_lut_low = val_to_color_array(np.arange(65536)*0.01)
 
-def plot_cycle_spg():
-    global plot_spg, max_devices, last_data_id, spg_len, active_devices
-    for event in pygame.event.get():
-        if(event.type == pygame.QUIT): sys.exit()
-    screen.fill([0,0,0])
-    cur_devices = 0
-    screen.lock()
-    for d in range(max_devices):
-        if(not_updated_cnt[d] > 1000): continue
-        cur_devices += 1
-        DX = 10
-        YS = height/6/(active_devices+1)
-        DY = height/2 - YS*6*active_devices/2 + YS*6*(cur_devices-1) # (1+active_devices) * (d+1)
-        x_scale = (width - DX*2) / spg_len
-        for x in range(spg_len):
-            for n in range(4):
-                bx = DX+x*x_scale
-                by = DY+YS*n
-                rw = x_scale
-                rh = YS
-                val = plot_spg[d][x*4+3-n]
-                if(n == 3): val *= 0.01
-                cl = val_to_color(val)
-                screen.fill(cl,(bx,by,rw,rh))
-                xy = []
-        
-        pygame.draw.lines(screen, cl, False, xy)
+#spectrogram is drawn at 1 pixel per cell, then scaled up in a single blit
+spg_surf = pygame.Surface((spg_len, 4))
+spg_img = np.zeros((spg_len, 4, 3), dtype=np.uint8)
+spg_img_rows = spg_img.transpose(1, 0, 2) #same pixels, one row per displayed band
+
+def draw_spg(d, DX, DY, w, h):
+    w = int(w)
+    h = int(h)
+    if(w < 1 or h < 1 or DY >= height or DY + h <= 0): return pygame.Rect(int(DX), int(DY), 0, 0) #nothing visible to color
+    spg = np.roll(plot_spg[d], -spg_head[d], axis=1)
+    spg_img_rows[0:3] = val_color_lut[spg[3:0:-1]]
+    spg_img_rows[3] = val_color_lut_low[spg[0]]
+    pygame.surfarray.blit_array(spg_surf, spg_img)
+    return screen.blit(pygame.transform.scale(spg_surf, (w, h)), (DX, DY))
+
+#row geometry of plot_cycle_spg / plot_cycle_tester depends only on the number of active devices:
+#per slot (YS, DY, acc_y0, compass_cy, batt_dy), built once per device count
+layout_cache = {}
+
+def row_layout(active):
+    rows = layout_cache.get(active)
+    if(rows is None):
+        YS = height/6/(active+1)
+        rows = []
+        for slot in range(max_devices):
+            DY = height/2 - YS*6*active/2 + YS*6*slot
+            rows.append((YS, DY, DY*1.2 + YS*4, DY + YS*2, DY + YS))
+        layout_cache[active] = rows
+    return rows
 
+#fixed horizontal positions of the tester widgets
+tester_spg_w = 0.4*(width - 20)
+rssi_x0 = 10 + width*0.05
+rssi_x1 = 10 + width*0.35
+rssi_w = width*0.3
+tester_emg_k = height*0.5/32768
+compass_cx = 10 + width*0.85
+batt_dx = 10 + width*0.95
+batt_w = width * 0.03
+
+#(active_devices, slot count) the spectrogram screen was last fully drawn for
+spg_shown = None
+
+def plot_cycle_spg():
+    global plot_spg, max_devices, last_data_id, spg_len, active_devices, plot_dirty, spg_shown
+    plot_events()
+    if(not plot_dirty): return active_devices
+    plot_dirty = False
+    slots = [d for d in range(max_devices) if not_updated_cnt[d] <= 1000]
+    cur_devices = len(slots)
+    full = spg_shown != (active_devices, cur_devices)
+    if(full): screen.fill([0,0,0])
+    rects = []
+    rows = row_layout(active_devices)
+    for slot, d in enumerate(slots):
+        YS, DY = rows[slot][0:2]
+        rects.append(draw_spg(d, 10, DY, width - 20, YS*4))
         
 #    screen.blit(ball, ballrect)
-    screen.unlock()
-    pygame.display.flip()        
+    if(full): #layout changed: spectrograms may have moved
+        pygame.display.flip()
+        spg_shown = (active_devices, cur_devices)
+    else: pygame.display.update(rects) #opaque blits fully cover the old rows
     active_devices = cur_devices
     return active_devices
 
-def plot_cycle_tester():
-    global plot_spg, max_devices, last_data_id, spg_len, active_devices
-    for event in pygame.event.get():
-        if(event.type == pygame.QUIT): sys.exit()
-    screen.fill([0,0,0])
-    cur_devices = 0
-    screen.lock()
-    for d in range(max_devices):
-        if(not_updated_cnt[d] > 1000): continue
-        cur_devices += 1
-        DX = 10
-        YS = height/6/(active_devices+1)
-        DY = height/2 - YS*6*active_devices/2 + YS*6*(cur_devices-1) # (1+active_devices) * (d+1)
-        x_scale = 0.4*(width - DX*2) / spg_len
-
-        xy = []
-
-        for x in range(spg_len):
-            for n in range(4):
-                bx = DX+x*x_scale
-                by = DY+YS*n
-                rw = x_scale
-                rh = YS
-                val = plot_spg[d][x*4+3-n]
-                if(n == 3): val *= 0.01
-                cl = val_to_color(val)
-                screen.fill(cl,(bx,by,rw,rh))
-        xy = []
-        for x in range(spg_len):
-            ax = plot_ax[d][x] / 8129 * YS + YS*4
-            xy.append([DX+x*x_scale, DY*1.2+ax])
-
-        cl = 255,0,0 #num_to_color(d)        
-        pygame.draw.lines(screen, cl, False, xy)
+#tester outlines that only move when the layout does: RSSI frames and battery outlines
+def rssi_frame(surf, DY):
+    xy = []
+    xy.append([rssi_x0, DY - 30])
+    xy.append([rssi_x1, DY - 30])
+    xy.append([rssi_x1, DY - 5])
+    xy.append([rssi_x0, DY - 5])
+    xy.append([rssi_x0, DY - 30])
+    pygame.draw.lines(surf, (255,255,255), False, xy)
 
-        xy = []
-        for x in range(spg_len):
-            ay = plot_ay[d][x] / 8129 * YS + YS*4
-            xy.append([DX+x*x_scale, DY*1.2+ay])
+def batt_frame(surf, batt_dy, batt_h, cl):
+    xy = []
+    xy.append([batt_dx, batt_dy])
+    xy.append([batt_dx, batt_dy + batt_h])
+    xy.append([batt_dx + batt_w, batt_dy + batt_h])
+    xy.append([batt_dx + batt_w, batt_dy])
+    xy.append([batt_dx, batt_dy])
+    pygame.draw.lines(surf, cl, False, xy)
 
-        cl = (255,255,0) #num_to_color(d)        
+#prerendered background with the outlines of all slots, rebuilt when the layout changes
+tester_bg = None
+tester_bg_key = None
+
+def tester_background(active, slot_cnt):
+    global tester_bg, tester_bg_key
+    if(tester_bg_key != (active, slot_cnt)):
+        tester_bg = pygame.Surface(size).convert()
+        tester_bg.fill((0,0,0))
+        rows = row_layout(active)
+        for slot in range(slot_cnt):
+            YS, DY, acc_y0, compass_cy, batt_dy = rows[slot]
+            rssi_frame(tester_bg, DY)
+            batt_frame(tester_bg, batt_dy, YS*3, (50,150,150))
+        tester_bg_key = (active, slot_cnt)
+    return tester_bg
+
+def plot_cycle_tester():
+    global plot_spg, max_devices, last_data_id, spg_len, active_devices, plot_dirty
+    plot_events()
+    if(not plot_dirty): return active_devices
+    plot_dirty = False
+    slots = [d for d in range(max_devices) if not_updated_cnt[d] <= 1000]
+    cur_devices = len(slots)
+    screen.blit(tester_background(active_devices, cur_devices), (0,0))
+    rects_by_color = defaultdict(list) #bars are filled together after all devices are drawn
+    rows = row_layout(active_devices)
+    acc_k = rows[0][0] / 8129 #row height is the same for all slots
+    compass_R = rows[0][0]*2
+    mag_angle = pi - dev_mag_angle[slots]
+    mag_sin = (np.sin(mag_angle)*compass_R).tolist()
+    mag_cos = (np.cos(mag_angle)*compass_R).tolist()
+    for slot, d in enumerate(slots):
+        YS, DY, acc_y0, compass_cy, batt_dy = rows[slot]
+        draw_spg(d, 10, DY, tester_spg_w, YS*4)
+
+        acc = plot_accel[d]
+        sp = spg_head[d]
+        xy = trace_set(tester_acc_xy, acc[:,0], sp, acc_y0, acc_k)
+        cl = color_red #num_to_color(d)        
         pygame.draw.lines(screen, cl, False, xy)
 
-        xy = []
-        for x in range(spg_len):
-            az = plot_az[d][x] / 8129 * YS + YS*4
-            xy.append([DX+x*x_scale, DY*1.2+az])
+        xy = trace_set(tester_acc_xy, acc[:,1], sp, acc_y0, acc_k)
+        cl = color_yellow #num_to_color(d)        
+        pygame.draw.lines(screen, cl, False, xy)
 
-        cl = (0,0,255) #num_to_color(d)        
+        xy = trace_set(tester_acc_xy, acc[:,2], sp, acc_y0, acc_k)
+        cl = color_blue #num_to_color(d)        
         pygame.draw.lines(screen, cl, False, xy)
 
-        xy = []
-        DX = 10 + x_scale*spg_len + 10
 #        DY = height/2 - YS*6*active_devices/2 + YS*6*(cur_devices-1) # (1+active_devices) * (d+1)
 #        DY = height/(1+active_devices) * (d+1)
-        x_scale = 0.4*(width - 20) / plot_len
-        for x in range(plot_len):
-#            xy.append([DX+x*x_scale, DY+(plot_emg[d][x]-y_zero[d])*y_scale[d]])
-            xy.append([DX+x*x_scale, DY+(plot_emg[d][x]-0)*height*0.5/32768])
-        cl = num_to_color(d)
+#        xy = trace_xy(tester_emg_x, DY + (emg_ordered(d) - y_zero[d])*y_scale[d])
+        xy = trace_set(tester_emg_xy, envelope(emg_ordered(d), tester_emg_bins), 0, DY, tester_emg_k)
+        cl = dev_colors[d]
         pygame.draw.lines(screen, cl, False, xy)
 
-        DX = 10
-        
-
 #RSSI drawing        
-        xy = []
-        xy.append([DX + width*0.05, DY - 30])
-        xy.append([DX + width*0.35, DY - 30])
-        xy.append([DX + width*0.35, DY - 5])
-        xy.append([DX + width*0.05, DY - 5])
-        xy.append([DX + width*0.05, DY - 30])
-        cl = 255,255,255
-        pygame.draw.lines(screen, cl, False, xy)
-        
         sig_level = 0
         if(dev_rssi[d] > 1):
             sig_level = (90 - dev_rssi[d])*1.6 #reasonable 0-100 scale
@@ -227,135 +362,77 @@ def plot_cycle_tester():
         if(sig_level > 55): cl = 0,100,150
         if(sig_level > 80): cl = 0,200,0
         
-        x_sz = sig_level*0.01 * width*0.3 - 2
-        screen.fill(cl,(DX + width*0.05+1,DY - 29,x_sz,23))
+        x_sz = sig_level*0.01 * rssi_w - 2
+        rects_by_color[cl].append((rssi_x0+1,DY - 29,x_sz,23))
 
 #Compass drawing        
-        mag_angle = 3.1415 - dev_mag_angle[d]
-        compass_R = YS*2
-        compass_D = 0.1 * compass_R
-        compass_cx = DX + width*0.85
-        compass_cy = DY + compass_R
-        N_x = compass_cx + compass_R * sin(mag_angle)
-        N_y = compass_cy + compass_R * cos(mag_angle)
-        S_x = compass_cx + compass_R * sin(3.1415 + mag_angle)
-        S_y = compass_cy + compass_R * cos(3.1415 + mag_angle)
-        E_x = compass_cx + compass_D * sin(3.1415/2 + mag_angle)
-        E_y = compass_cy + compass_D * cos(3.1415/2 + mag_angle)
-        W_x = compass_cx + compass_D * sin(3*3.1415/2 + mag_angle)
-        W_y = compass_cy + compass_D * cos(3*3.1415/2 + mag_angle)
-        xy = []
-        xy.append([N_x, N_y])
-        xy.append([E_x, E_y])
-        xy.append([W_x, W_y])
-        xy.append([N_x, N_y])
-        cl = 0,0,255
-        pygame.draw.lines(screen, cl, False, xy)
-        xy = []
-        xy.append([S_x, S_y])
-        xy.append([E_x, E_y])
-        xy.append([W_x, W_y])
-        xy.append([S_x, S_y])
-        cl = 255,0,0
-        pygame.draw.lines(screen, cl, False, xy)
-
-#IMU drawing        
-        imu_S = YS
-        imu_cx = DX + width*0.9
-        imu_cy = DY + imu_S
-        N_x = compass_cx + compass_R * sin(mag_angle)
-        N_y = compass_cy + compass_R * cos(mag_angle)
-        S_x = compass_cx + compass_R * sin(3.1415 + mag_angle)
-        S_y = compass_cy + compass_R * cos(3.1415 + mag_angle)
-        E_x = compass_cx + compass_D * sin(3.1415/2 + mag_angle)
-        E_y = compass_cy + compass_D * cos(3.1415/2 + mag_angle)
-        W_x = compass_cx + compass_D * sin(3*3.1415/2 + mag_angle)
-        W_y = compass_cy + compass_D * cos(3*3.1415/2 + mag_angle)
-        xy = []
-        xy.append([N_x, N_y])
-        xy.append([E_x, E_y])
-        xy.append([W_x, W_y])
-        xy.append([N_x, N_y])
-        cl = 0,0,255
-        pygame.draw.lines(screen, cl, False, xy)
-        xy = []
-        xy.append([S_x, S_y])
-        xy.append([E_x, E_y])
-        xy.append([W_x, W_y])
-        xy.append([S_x, S_y])
-        cl = 255,0,0
-        pygame.draw.lines(screen, cl, False, xy)
+        s = mag_sin[slot] #scaled by compass_R, the E/W arms are 0.1 of it
+        c = mag_cos[slot]
+        N = (compass_cx + s, compass_cy + c)
+        S = (compass_cx - s, compass_cy - c)
+        E = (compass_cx + 0.1*c, compass_cy - 0.1*s)
+        W = (compass_cx - 0.1*c, compass_cy + 0.1*s)
+        pygame.draw.polygon(screen, color_blue, (N, E, W), 1)
+        pygame.draw.polygon(screen, color_red, (S, E, W), 1)
         
 #Battery drawing        
         batt_perc = (dev_batt[d] - 3100)/10
         if(batt_perc < 0): batt_perc = 0
-        batt_dx = DX + width*0.95
-        batt_w = width * 0.03
-        batt_dy = DY + YS
         batt_h = YS*3
-        xy = []
-        xy.append([batt_dx, batt_dy])
-        xy.append([batt_dx, batt_dy + batt_h])
-        xy.append([batt_dx + batt_w, batt_dy + batt_h])
-        xy.append([batt_dx + batt_w, batt_dy])
-        xy.append([batt_dx, batt_dy])
-        cl = 50,150,150
-        if(batt_perc < 20): cl = 150,0,0
-        pygame.draw.lines(screen, cl, False, xy)
+        if(batt_perc < 20): batt_frame(screen, batt_dy, batt_h, color_batt_low) #background has the normal outline
         cl = 0,200,0
         if(batt_perc < 70): cl = 0,100,150
         if(batt_perc < 40): cl = 150,150,0
         if(batt_perc < 15): cl = 255,0,0
         batt_fh = batt_h * batt_perc / 100 - 1
         if(batt_fh < 2): batt_fh = 2
-        screen.fill(cl,(batt_dx+1,batt_dy + batt_h - batt_fh - 1, batt_w - 2, batt_fh))
-        
-        
+        rects_by_color[cl].append((batt_dx+1,batt_dy + batt_h - batt_fh - 1, batt_w - 2, batt_fh))
         
+    for cl, rects in rects_by_color.items():
+        for r in rects: screen.fill(cl, r)
             
 #    screen.blit(ball, ballrect)
-    screen.unlock()
     pygame.display.flip()        
     active_devices = cur_devices
     return active_devices
 
+device_status = operator.attrgetter('rssi', 'mag_angle', 'batt')
+
 def plot_prepare(devices):
-    global plot_emg, plot_spg, max_devices, last_data_id, y_zero, active_devices
+    global plot_emg, plot_spg, max_devices, last_data_id, y_zero, active_devices, plot_dirty
     for i in range(max_devices): not_updated_cnt[i] += 1
     cnt = len(devices)
     if(cnt < 1): return
     for d in range(cnt):
         if(devices[d].data_id != last_data_id[d]):
             not_updated_cnt[d] = 0
-            for n in range(4):
-                plot_spg[d].append(devices[d].device_spectr[n])
-            for x in range(devices[d].data_count):
-                val = devices[d].data_array[x]
-                plot_emg[d].append(val)
-                y_zero[d] = 0.997*y_zero[d] + 0.003*val
-            
-            plot_ax[d].append(devices[d].ax)
-            plot_ay[d].append(devices[d].ay)
-            plot_az[d].append(devices[d].az)
-            plot_Q[d].append(devices[d].Qsg[0])
-            plot_Q[d].append(devices[d].Qsg[1])
-            plot_Q[d].append(devices[d].Qsg[2])
-            plot_Q[d].append(devices[d].Qsg[3])
+            plot_dirty = True
+            sp = spg_head[d]
+            plot_spg[d, :, sp] = devices[d].device_spectr[0:4]
+            plot_accel[d, sp] = (devices[d].ax, devices[d].ay, devices[d].az)
+            plot_Q[d, sp] = devices[d].Qsg
+            spg_head[d] = (sp + 1) % spg_len
+
+            dcnt = devices[d].data_count
+            vals = devices[d].data_array[0:dcnt]
+            eh = emg_head[d]
+            if(eh + dcnt <= plot_len):
+                plot_emg[d, eh:eh+dcnt] = vals
+            else: #wraps around the buffer end
+                k = plot_len - eh
+                plot_emg[d, eh:] = vals[0:k]
+                plot_emg[d, 0:dcnt-k] = vals[k:]
+            emg_head[d] = (eh + dcnt) % plot_len
+            new_samples[d] += dcnt
+            if(dcnt > 0): #same as applying y_zero = 0.997*y_zero + 0.003*val for each sample in turn
+                y_zero[d] = y_zero_decay[dcnt]*y_zero[d] + np.dot(y_zero_w[-dcnt:], vals)
             
         last_data_id[d] = devices[d].data_id
-        if(hasattr(devices[d], 'rssi')):
-            dev_rssi[d] = devices[d].rssi
-        if(hasattr(devices[d], 'mag_angle')):
-            dev_mag_angle[d] = devices[d].mag_angle
-        if(hasattr(devices[d], 'batt')):
-            dev_batt[d] = devices[d].batt
-        if(len(plot_emg[d]) < 2): return
-        plot_emg[d] = plot_emg[d][-plot_len:]
-        plot_spg[d] = plot_spg[d][-spg_len*4:]
-        plot_ax[d] = plot_ax[d][-spg_len:]
-        plot_ay[d] = plot_ay[d][-spg_len:]
-        plot_az[d] = plot_az[d][-spg_len:]
-        plot_Q[d] = plot_Q[d][-spg_len*4:]
+    #status fields are copied for all devices at once
+    rssi, mag_angle, batt = zip(*map(device_status, devices))
+    dev_rssi[0:cnt] = rssi
+    dev_mag_angle[0:cnt] = mag_angle
+    dev_batt[0:cnt] = batt
 #    print(plot_emg[0])
     return devices[0].data_id
 
@@ -1,25 +1,36 @@
 #kinda main
 
 import umyo_parser
+import time
 
 import numpy as np
 from matplotlib import pyplot as plt
 
-plot_ys = [0]*1000
+plot_len = 1000
+plot_ys = np.zeros(plot_len, dtype=np.float32) #circular buffer, plot_head is the oldest sample
+plot_head = 0
 
 def plot_prepare():
-    global plot_ys
+    global plot_ys, plot_head
     devices = umyo_parser.umyo_get_list()
     cnt = len(devices)
     if(cnt < 1): return
-    for x in range(devices[0].data_count):
-        val = devices[0].data_array[x]
-        plot_ys.append(val)
-    if(len(plot_ys) < 2): return
-    plot_ys = plot_ys[-1000:]
-    print(plot_ys[0])
+    n = devices[0].data_count
+    vals = devices[0].data_array[0:n]
+    h = plot_head
+    if(h + n <= plot_len):
+        plot_ys[h:h+n] = vals
+    else: #wraps around the buffer end
+        k = plot_len - h
+        plot_ys[h:] = vals[0:k]
+        plot_ys[0:n-k] = vals[k:]
+    plot_head = (h + n) % plot_len
     return devices[0].data_id
 
+#buffer contents in time order, oldest first
+def plot_ordered():
+    return np.concatenate((plot_ys[plot_head:], plot_ys[:plot_head]))
+
 # list
 from serial.tools import list_ports
 port = list(list_ports.comports())
@@ -31,34 +42,46 @@ print("===")
 
 #read
 import serial
-ser = serial.Serial(port=device, baudrate=921600, parity=serial.PARITY_NONE, stopbits=1, bytesize=8, timeout=0)
+ser = serial.Serial(port=device, baudrate=921600, parity=serial.PARITY_NONE, stopbits=1, bytesize=8, timeout=0.005)
 
 print("conn: " + ser.portstr)
 
-plt.axis([0,1000,0,10000])
 plt.ion()
+fig, ax = plt.subplots()
 plt.show()
-x = [0]
-for i in range(999):
-    x.append(1+i)
-#x = np.arange(0, len(plot_ys))
-line, = plt.plot(x, plot_ys)
-plt.ylim(7000,9000)
-plt.draw()
+x = np.arange(0, plot_len)
+line, = ax.plot(x, plot_ys, animated=True) #drawn by hand on top of the cached background
+ax.set_xlim(0, plot_len)
+y_lo = 7000
+ax.set_ylim(y_lo, y_lo+2000)
+
+#every full redraw (first show, window resize, ylim change) refreshes the cached background
+bg = None
+def on_draw(event):
+    global bg
+    bg = fig.canvas.copy_from_bbox(ax.bbox)
+    ax.draw_artist(line)
+fig.canvas.mpl_connect('draw_event', on_draw)
+fig.canvas.draw()
 plt.pause(0.01)
 
-last_data_upd = 0
+frame_dt = 1/30 #redraw rate, independent of the sample rate
+last_draw = time.monotonic()
 while(1):
-    cnt = ser.in_waiting
-    if(cnt > 0):
-        data = ser.read(cnt)
+    data = umyo_parser.umyo_read(ser)
+    if(len(data) > 0):
         umyo_parser.umyo_parse_preprocessor(data)
-        dat_id = plot_prepare()
-        d_diff = dat_id - last_data_upd
-        if(d_diff > 100):
-            plt.ylim(plot_ys[0]-1000,plot_ys[0]+1000)
-            last_data_upd = dat_id
-            line.set_ydata(plot_ys)
-            plt.draw()
-            plt.pause(0.001)
-
+        plot_prepare()
+        now = time.monotonic()
+        if(now - last_draw >= frame_dt):
+            last_draw = now
+            y_cur = plot_ys[plot_head]
+            if(y_cur < y_lo + 200 or y_cur > y_lo + 1800): #recenter: axes change, full redraw once
+                y_lo = y_cur - 1000
+                ax.set_ylim(y_lo, y_lo+2000)
+                fig.canvas.draw() #on_draw captures the new background
+            line.set_ydata(plot_ordered())
+            fig.canvas.restore_region(bg)
+            ax.draw_artist(line)
+            fig.canvas.blit(ax.bbox)
+            fig.canvas.flush_events()
@@ -1,13 +1,13 @@
-import math
+from math import sqrt
 from collections import namedtuple
 sV = namedtuple("sV", "x y z")
 sQ = namedtuple("sQ", "w x y z")
 
 def q_norm(q):
-    return math.sqrt(q.x*q.x + q.y*q.y + q.z*q.z + q.w*q.w);
+    return sqrt(q.x*q.x + q.y*q.y + q.z*q.z + q.w*q.w);
 
 def v_norm(v):
-    return math.sqrt(v.x*v.x + v.y*v.y + v.z*v.z);
+    return sqrt(v.x*v.x + v.y*v.y + v.z*v.z);
 
 def q_renorm(q):
     r = q_norm(q);
@@ -71,7 +71,7 @@ def v_dot(v1, v2):
 def q_from_vectors(u, v):
     d = v_dot(u, v);
     w = v_mult(u, v);
-    w = d + math.sqrt(d*d + v_dot(w, w));
+    w = d + sqrt(d*d + v_dot(w, w));
     x = w.x;
     y = w.y;
     z = w.z;
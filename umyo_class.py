@@ -6,6 +6,7 @@ class uMyo:
         self.packet_type = 0
         self.data_count = 0
         self.batt = 0
+        self.rssi = 0
         self.version = 0
         self.steps = 0
         self.data_id = 0
@@ -26,6 +27,9 @@ class uMyo:
         self.yaw_speed = 0
         self.pitch_speed = 0
         self.roll_speed = 0
+        self.ax = 0
+        self.ay = 0
+        self.az = 0
         self.mag_angle = 0
     
     
@@ -21,7 +21,7 @@ print("===")
 
 #read
 import serial
-ser = serial.Serial(port=device, baudrate=921600, parity=serial.PARITY_NONE, stopbits=1, bytesize=8, timeout=0)
+ser = serial.Serial(port=device, baudrate=921600, parity=serial.PARITY_NONE, stopbits=1, bytesize=8, timeout=0.005)
 
 print("conn: " + ser.portstr)
 last_data_upd = 0
@@ -44,6 +44,9 @@ calibrate_progress = 0
 prev_dx = 0
 prev_dy = 0
 prev_dr = 0
+acc_dx = 0 #sub-pixel motion / sub-step scroll not yet sent to the OS
+acc_dy = 0
+acc_dr = 0
 relaxed_avg0 = 100
 active_avg0 = 500000
 relaxed_avg1 = 100
@@ -64,11 +67,10 @@ mouse_sticky_move = 0
 mouse_sticky_state = 0
 
 while(1):
-    cnt = ser.in_waiting
-    if(cnt > 0):
+    data = umyo_parser.umyo_read(ser)
+    if(len(data) > 0):
 #        print(parse_unproc_cnt)
         cnt_corr = parse_unproc_cnt/200
-        data = ser.read(cnt)
         parse_unproc_cnt = umyo_parser.umyo_parse_preprocessor(data)
         umyos = umyo_parser.umyo_get_list()
         if(len(umyos) < 2): continue
@@ -76,22 +78,14 @@ while(1):
             zero_Q = sQ(umyos[0].Qsg[0], umyos[0].Qsg[1], umyos[0].Qsg[2], umyos[0].Qsg[3])
             zero_Q = q_renorm(zero_Q)
             need_zero_update = 0
-        cur_Q = sQ(umyos[0].Qsg[0], umyos[0].Qsg[1], umyos[0].Qsg[2], umyos[0].Qsg[3])
-        cur_Q = q_renorm(cur_Q)
 #        mouse.is_pressed("left")
 #        print(zero_Q.w, zero_Q.x, zero_Q.y, zero_Q.z)
-#        print(cur_Q.w, cur_Q.x, cur_Q.y, cur_Q.z)
-        zq_inv = q_make_conj(zero_Q)
-        diff_Q = q_mult(cur_Q, zq_inv)
-#        print(diff_Q)
-        qV = sV(diff_Q.x, diff_Q.y, diff_Q.z)
-#        print(diff_Q.w)
-        ww = diff_Q.w
-        if(diff_Q.w > 1): ww = 1
-        qA = math.acos(ww)
-        dx = qA * v_dot(rot_X, qV)
-        dy = qA * v_dot(rot_Y, qV)
-        dr = qA * v_dot(rot_Z, qV)
+#        ww = diff_Q.w
+#        if(diff_Q.w > 1): ww = 1
+#        qA = math.acos(ww)
+#        dx = qA * v_dot(rot_X, qV)
+#        dy = qA * v_dot(rot_Y, qV)
+#        dr = qA * v_dot(rot_Z, qV)
         dx = umyos[0].yaw
         dy = umyos[0].pitch
         dr = umyos[0].roll
@@ -143,11 +137,27 @@ while(1):
         print(savg0, mouse_sticky_move, mouse_sticky_state)
         
         if(calibrate_requested == 0):
-            if(mouse_scroll_active > 0 and (ddr > 1 or ddr < -1)): 
-                pyautogui.scroll(round(-ddr))
+            if(mouse_scroll_active > 0):
+                if(ddr > 1 or ddr < -1): acc_dr -= ddr #dead zone: per-sample noise below one step is not accumulated
+                if(acc_dr >= 1 or acc_dr <= -1):
+                    n_r = int(acc_dr)
+                    pyautogui.scroll(n_r)
+                    acc_dr -= n_r
+            else: acc_dr = 0
 #                mouse.wheel(round(ddr))
-            if(mouse_move_active > 0 and (ddx > 1 or ddx < -1 or ddy > 1 or ddy < -1)): 
-                pyautogui.move(ddx, -ddy)
+            if(mouse_move_active > 0):
+                if(ddx > 1 or ddx < -1 or ddy > 1 or ddy < -1): #same dead zone for motion
+                    acc_dx += ddx
+                    acc_dy -= ddy
+                if(acc_dx >= 1 or acc_dx <= -1 or acc_dy >= 1 or acc_dy <= -1):
+                    n_x = int(acc_dx)
+                    n_y = int(acc_dy)
+                    pyautogui.move(n_x, n_y)
+                    acc_dx -= n_x
+                    acc_dy -= n_y
+            else:
+                acc_dx = 0
+                acc_dy = 0
 #                mouse.move(ddx*math.sqrt(math.fabs(ddx)), -ddy*math.sqrt(math.fabs(ddy)), False)
             if(mouse_click_active > 0):
                 if(clicked == 0):
@@ -161,6 +171,14 @@ while(1):
         T = 300
         avg0 = avg0*0.999 + 0.001*ch0
         if(calibrate_requested > 0):
+            #rotation from the zero orientation, only needed to capture the calibration axes
+            cur_Q = sQ(umyos[0].Qsg[0], umyos[0].Qsg[1], umyos[0].Qsg[2], umyos[0].Qsg[3])
+            cur_Q = q_renorm(cur_Q)
+#            print(cur_Q.w, cur_Q.x, cur_Q.y, cur_Q.z)
+            zq_inv = q_make_conj(zero_Q)
+            diff_Q = q_mult(cur_Q, zq_inv)
+#            print(diff_Q)
+            qV = sV(diff_Q.x, diff_Q.y, diff_Q.z)
             calibrate_progress = (time.time() - calibrate_stage_start) * 30
             if(calibrate_progress > 100):
                 calibrate_stage = calibrate_stage+1
@@ -1,14 +1,16 @@
 #parser
 
 import umyo_class
+import struct
 import quat_math
 #from quat_math import sV
 from quat_math import *
-import math
+from math import atan2, acos
 
 parse_buf = bytearray(0)
 
 umyo_list = []
+data_fmt = ['>%dh' % n for n in range(40)] #struct formats by sample count (packet_type - 80)
 unseen_cnt = []
 
 def id2idx(uid):
@@ -62,72 +64,22 @@ def umyo_parse(pos):
     umyo_list[idx].prev_data_id = data_id
     if(d_id < 0): d_id += 256
     umyo_list[idx].data_id += d_id
-    for x in range(umyo_list[idx].data_count):
-        hb = parse_buf[pp]; pp+=1
-        lb = parse_buf[pp]; pp+=1
-        val = hb*256 + lb
-        if(hb > 127):
-            val = -65536 + val
-        umyo_list[idx].data_array[x] = val
-
-    for x in range(4):
-        hb = parse_buf[pp]; pp+=1
-        lb = parse_buf[pp]; pp+=1
-        val = hb*256 + lb
-#        if(hb > 127):
-#            val = -65536 + val
-        umyo_list[idx].device_spectr[x] = val
-
-    hb = parse_buf[pp]; pp+=1; lb = parse_buf[pp]; pp+=1; val = hb*256 + lb    
-    if(val > 32767): val = -(65536-val)
-    qww = val
-    hb = parse_buf[pp]; pp+=1; lb = parse_buf[pp]; pp+=1; val = hb*256 + lb    
-    if(val > 32767): val = -(65536-val)
-    qwx = val
-    hb = parse_buf[pp]; pp+=1; lb = parse_buf[pp]; pp+=1; val = hb*256 + lb    
-    if(val > 32767): val = -(65536-val)
-    qwy = val
-    hb = parse_buf[pp]; pp+=1; lb = parse_buf[pp]; pp+=1; val = hb*256 + lb    
-    if(val > 32767): val = -(65536-val)
-    qwz = val
-
-    hb = parse_buf[pp]; pp+=1; lb = parse_buf[pp]; pp+=1; val = hb*256 + lb    
-    if(val > 32767): val = -(65536-val)
-    ax = val
-    hb = parse_buf[pp]; pp+=1; lb = parse_buf[pp]; pp+=1; val = hb*256 + lb    
-    if(val > 32767): val = -(65536-val)
-    ay = val
-    hb = parse_buf[pp]; pp+=1; lb = parse_buf[pp]; pp+=1; val = hb*256 + lb    
-    if(val > 32767): val = -(65536-val)
-    az = val
-    
-    hb = parse_buf[pp]; pp+=1; lb = parse_buf[pp]; pp+=1; val = hb*256 + lb    
-    if(val > 32767): val = -(65536-val)
-    yaw = val
-    hb = parse_buf[pp]; pp+=1; lb = parse_buf[pp]; pp+=1; val = hb*256 + lb    
-    if(val > 32767): val = -(65536-val)
-    pitch = val
-    hb = parse_buf[pp]; pp+=1; lb = parse_buf[pp]; pp+=1; val = hb*256 + lb    
-    if(val > 32767): val = -(65536-val)
-    roll = val
+    n = umyo_list[idx].data_count #big endian int16 samples, unpacked in one call
+    umyo_list[idx].data_array[0:n] = struct.unpack_from(data_fmt[n], parse_buf, pp); pp += 2*n
+
+    umyo_list[idx].device_spectr[0:4] = struct.unpack_from('>4H', parse_buf, pp); pp += 8
+
+    qww, qwx, qwy, qwz, ax, ay, az, yaw, pitch, roll = struct.unpack_from('>10h', parse_buf, pp); pp += 20
 
     mx = 0;
     my = 0;
     mz = 0;
     if(pos + packet_len > pp + 5): #also has magn data
-        hb = parse_buf[pp]; pp+=1; lb = parse_buf[pp]; pp+=1; val = hb*256 + lb    
-        if(val > 32767): val = -(65536-val)
-        mx = val
-        hb = parse_buf[pp]; pp+=1; lb = parse_buf[pp]; pp+=1; val = hb*256 + lb    
-        if(val > 32767): val = -(65536-val)
-        my = val
-        hb = parse_buf[pp]; pp+=1; lb = parse_buf[pp]; pp+=1; val = hb*256 + lb    
-        if(val > 32767): val = -(65536-val)
-        mz = val
+        mx, my, mz = struct.unpack_from('>3h', parse_buf, pp); pp += 6
     nyr = sV(0, 1, 0)
     Qsg = sQ(qww, qwx, qwy, qwz)    
     nyr = quat_math.rotate_v(Qsg, nyr);
-    yaw_q = math.atan2(nyr.y, nyr.x);
+    yaw_q = atan2(nyr.y, nyr.x);
     
     M = sV(mx, my, mz)
     M = v_renorm(M)
@@ -144,11 +96,11 @@ def umyo_parse(pos):
     HM = v_mult(H_hor, M_hor)
     asign = -1
     if(v_dot(HM, A) < 0): asign = 1
-    mag_angle = asign*math.acos(v_dot(H_hor, M_hor))
-#    print("calc mag A", asign*math.acos(v_dot(H_hor, M_hor)))
+    mag_angle = asign*acos(v_dot(H_hor, M_hor))
+#    print("calc mag A", asign*acos(v_dot(H_hor, M_hor)))
 #    print("mag", mx, my, mz)
 #    print("A", ax, ay, az)
-    pitch = round(math.atan2(ay, az)*1000)
+    pitch = round(atan2(ay, az)*1000)
 #    print("angles", yaw, pitch, roll)
 #    print("yaw_calc", yaw_q) 
 
@@ -196,3 +148,8 @@ def umyo_parse_preprocessor(data):
 
 def umyo_get_list():
     return umyo_list
+
+#whatever the port has queued; when nothing is, sleeps in read (up to the port timeout)
+#instead of spinning on in_waiting
+def umyo_read(ser):
+    return ser.read(max(1, ser.in_waiting))
@@ -14,18 +14,17 @@ print("===")
 
 #read
 import serial
-ser = serial.Serial(port=device, baudrate=921600, parity=serial.PARITY_NONE, stopbits=1, bytesize=8, timeout=0)
+ser = serial.Serial(port=device, baudrate=921600, parity=serial.PARITY_NONE, stopbits=1, bytesize=8, timeout=0.005)
 
 print("conn: " + ser.portstr)
 last_data_upd = 0
 display_stuff.plot_init()
 parse_unproc_cnt = 0
 while(1):
-    cnt = ser.in_waiting
-    if(cnt > 0):
+    data = umyo_parser.umyo_read(ser)
+    if(len(data) > 0):
 #        print(parse_unproc_cnt)
         cnt_corr = parse_unproc_cnt/200
-        data = ser.read(cnt)
         parse_unproc_cnt = umyo_parser.umyo_parse_preprocessor(data)
         dat_id = display_stuff.plot_prepare(umyo_parser.umyo_get_list())
         d_diff = 0